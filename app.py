@@ -1,8 +1,111 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import openpyxl
 import time
 import io
 
+# 重复项可使用的后缀，按0-9 A-Z顺序依次尝试
+_ALPHABET = np.array(list('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+_ALPHABET_INDEX = pd.Index(_ALPHABET)
+
+# 页面样式及固定的HTML片段，只在模块加载时创建一次
+_CSS_BLOCK = """
+    <style>
+    .main {
+        padding: 2rem;
+    }
+    .stButton>button {
+        width: 100%;
+        border-radius: 8px;
+        height: 3em;
+        background-color: #FF4B4B;
+        color: white;
+        font-weight: 500;
+        transition: all 0.3s ease;
+    }
+    .stButton>button:hover {
+        background-color: #FF3333;
+        box-shadow: 0 4px 8px rgba(255, 75, 75, 0.2);
+    }
+    .stProgress > div > div > div > div {
+        background-color: #FF4B4B;
+    }
+    .instruction-box {
+        background-color: white;
+        padding: 1.5rem;
+        border-radius: 12px;
+        box-shadow: 0 4px 12px rgba(0, 0, 0, 0.05);
+        margin-bottom: 2rem;
+        border: 1px solid #f0f2f6;
+    }
+    h1, h4 {
+        font-family: 'Segoe UI', sans-serif;
+    }
+    </style>
+"""
+
+_TITLE_HTML = """
+    <h1 style='text-align: center; color: #FF4B4B; margin-bottom: 2rem; font-weight: 600; font-size: 2.5rem;'>
+        客户编号重复处理 🔄
+    </h1>
+"""
+
+_INSTRUCTION_HTML = """
+    <div class='instruction-box'>
+        <h4 style='color: #FF4B4B; margin-bottom: 1rem;'>📝 使用说明</h4>
+        <p style='color: #444; line-height: 1.6;'>1. 仅保留一列数据，将所有编号汇总到一张表上，第一行<b>客户编号</b></p>
+        <p style='color: #444; line-height: 1.6;'>2. 按照0-9 A-Z替换，如替换完仍然有重复，请手工手改</p>
+    </div>
+"""
+
+@st.cache_data(show_spinner=False)
+def load_excel(file_bytes):
+    """
+    读取上传的Excel文件内容，只读取'客户编号'列，按文件内容缓存，页面重新运行时不再重复解析。
+
+    :param file_bytes: 上传文件的字节内容
+    :return: 读取得到的DataFrame
+    """
+    return pd.read_excel(io.BytesIO(file_bytes), engine='calamine', usecols=lambda column: column == '客户编号')
+
+def assign_suffixes(group, is_dup, suffix_pos, n_suffix):
+    """
+    为重复项分配后缀，只在整数数组上计算，不涉及字符串。
+
+    :param group: 每行所属(社区编号, 基础ID)分组的整数编码
+    :param is_dup: 每行是否为重复项的布尔数组
+    :param suffix_pos: 每行最后一位在后缀表中的位置，不在表中为-1
+    :param n_suffix: 后缀表的长度
+    :return: 每行新后缀在后缀表中的位置，无需修改或后缀已用完的为-1
+    """
+    suffix = np.full(len(group), -1, dtype=np.int8)
+
+    # 只对含重复项的组用pd.factorize重新编码
+    relevant = np.isin(group, group[is_dup])
+    codes, uniques = pd.factorize(group[relevant])
+    codes = codes.astype(np.int32)
+    relevant_dup = is_dup[relevant]
+    relevant_pos = suffix_pos[relevant]
+
+    # 标记每组中已被首次出现的编号占用的后缀
+    taken = np.zeros((len(uniques), n_suffix), dtype=bool)
+    keep = ~relevant_dup & (relevant_pos >= 0)
+    taken[codes[keep], relevant_pos[keep]] = True
+
+    # 组内第n个重复项依次取第n个未被占用的后缀，后缀用完的保持原样
+    dup_group = codes[relevant_dup]
+    counts = np.bincount(dup_group, minlength=len(uniques))
+    nth = np.empty_like(dup_group)
+    nth[np.argsort(dup_group, kind='stable')] = np.arange(len(dup_group)) - np.repeat(np.cumsum(counts) - counts, counts)
+    free_order = np.argsort(taken, axis=1, kind='stable').astype(np.int8)
+    resolved = nth < (~taken).sum(axis=1)[dup_group]
+
+    dup_pos = np.flatnonzero(is_dup)[resolved]
+    suffix[dup_pos] = free_order[dup_group[resolved], nth[resolved]]
+    return suffix
+
+@st.cache_data(show_spinner=False)
 def process_duplicates(df):
     """
     处理DataFrame中的重复客户编号，为每个社区生成唯一的客户编号。
@@ -16,51 +119,44 @@ def process_duplicates(df):
     if '客户编号' not in df.columns:
         raise ValueError("上传的Excel文件必须包含'客户编号'列")
     
-    # 只保留客户编号列
-    df = df[['客户编号']]
+    # 只保留客户编号列，并统一转换为Arrow字符串类型
+    df = df[['客户编号']].astype('string[pyarrow]')
     
-    # 从客户编号中提取前8位作为社区编号
-    df['社区编号'] = df['客户编号'].astype(str).str[:8]
+    # 客户编号只切分一次：前8位为社区编号（只作为分组键，不加入DataFrame），
+    # 除最后一位外的部分为基础ID，最后一位为后缀
+    customer_ids = df['客户编号']
+    community = customer_ids.str[:8].astype('category')
+    base_ids = customer_ids.str[:-1]
+    last_chars = customer_ids.str[-1:]
     
-    # 将小写x转换为大写X
-    df['客户编号'] = df['客户编号'].astype(str).apply(lambda x: x[:-1] + 'X' if x.endswith('x') else x)
+    # 将小写x转换为大写X，只改写以x结尾的行
+    is_lower_x = (last_chars == 'x').fillna(False).to_numpy(dtype=bool)
+    if is_lower_x.any():
+        last_chars = last_chars.mask(is_lower_x, 'X')
+        df.loc[is_lower_x, '客户编号'] = base_ids[is_lower_x] + 'X'
     
-    # 在第二列插入新的列'修改后客户编号'，初始值为原'客户编号'
-    if '修改后客户编号' not in df.columns:
-        df.insert(1, '修改后客户编号', df['客户编号'])
-    
-    # 按社区分组处理
-    for community in df['社区编号'].unique():
-        # 创建当前社区的掩码
-        community_mask = df['社区编号'] == community
-        
-        # 根据掩码筛选出当前社区的数据并复制
-        community_df = df[community_mask].copy()
-        
-        # 找出所有重复项
-        seen_ids = set()
-        for idx in community_df.index:
-            # 获取原始客户编号
-            original_id = df.loc[idx, '客户编号']
-            # 取除最后一位外的部分作为基础ID
-            base_id = original_id[:-1]
-            
-            if original_id in seen_ids:
-                # 如果原始ID已存在，则生成新ID直到找到未使用的
-                for suffix in list('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'):
-                    new_id = base_id + suffix
-                    if new_id not in seen_ids:
-                        # 更新DataFrame中的'修改后客户编号'
-                        df.loc[idx, '修改后客户编号'] = new_id
-                        # 将新ID加入已见集合
-                        seen_ids.add(new_id)
-                        break
-            else:
-                # 如果原始ID不存在于已见集合中，直接加入
-                seen_ids.add(original_id)
-    
-    # 只保留需要的列
-    df = df[['客户编号', '修改后客户编号']]
+    # 同一社区内相同客户编号的出现序号，0为首次出现，大于0为重复项
+    rank = df.groupby([community, '客户编号'], sort=False, observed=True).cumcount().to_numpy()
+    is_dup = rank > 0
+
+    # 没有重复项时无需生成新编号，直接返回
+    if not is_dup.any():
+        df['修改后客户编号'] = df['客户编号']
+        return df, time.time() - start_time
+
+    # 最后一位在后缀表中的位置（不在表中为-1）
+    suffix_pos = _ALPHABET_INDEX.get_indexer(last_chars).astype(np.int8)
+
+    # 按(社区编号, 基础ID)分组，在整数编码上为每个重复项选择后缀
+    group = df.groupby([community, base_ids], sort=False, observed=True).ngroup().to_numpy()
+    suffix = assign_suffixes(group, is_dup, suffix_pos, len(_ALPHABET))
+
+    # 在数组中生成新编号后一次性写回'修改后客户编号'列
+    new_ids = df['客户编号'].to_numpy(dtype=object, copy=True)
+    changed = np.flatnonzero(suffix >= 0)
+    new_ids[changed] = base_ids.iloc[changed].to_numpy(dtype=object) + _ALPHABET[suffix[changed]]
+    # DataFrame中只有'客户编号'一列，新列追加后即为最终的两列，无需再次选取复制
+    df['修改后客户编号'] = pd.array(new_ids, dtype='string[pyarrow]')
     
     end_time = time.time()  # 记录结束时间
     processing_time = end_time - start_time
@@ -76,60 +172,17 @@ def main():
     )
 
     # 自定义CSS样式
-    st.markdown("""
-        <style>
-        .main {
-            padding: 2rem;
-        }
-        .stButton>button {
-            width: 100%;
-            border-radius: 8px;
-            height: 3em;
-            background-color: #FF4B4B;
-            color: white;
-            font-weight: 500;
-            transition: all 0.3s ease;
-        }
-        .stButton>button:hover {
-            background-color: #FF3333;
-            box-shadow: 0 4px 8px rgba(255, 75, 75, 0.2);
-        }
-        .stProgress > div > div > div > div {
-            background-color: #FF4B4B;
-        }
-        .instruction-box {
-            background-color: white;
-            padding: 1.5rem;
-            border-radius: 12px;
-            box-shadow: 0 4px 12px rgba(0, 0, 0, 0.05);
-            margin-bottom: 2rem;
-            border: 1px solid #f0f2f6;
-        }
-        h1, h4 {
-            font-family: 'Segoe UI', sans-serif;
-        }
-        </style>
-    """, unsafe_allow_html=True)
+    st.markdown(_CSS_BLOCK, unsafe_allow_html=True)
 
     # 页面标题
-    st.markdown("""
-        <h1 style='text-align: center; color: #FF4B4B; margin-bottom: 2rem; font-weight: 600; font-size: 2.5rem;'>
-            客户编号重复处理 🔄
-        </h1>
-    """, unsafe_allow_html=True)
+    st.markdown(_TITLE_HTML, unsafe_allow_html=True)
 
     # 创建三列布局
     col1, col2, col3 = st.columns([1, 2, 1])
 
     with col2:
         # 使用说明
-        st.markdown("""
-            <div class='instruction-box'>
-                <h4 style='color: #FF4B4B; margin-bottom: 1rem;'>📝 使用说明</h4>
-                <p style='color: #444; line-height: 1.6;'>1. 仅保留一列数据，将所有编号汇总到一张表上，第一行<b>客户编号</b></p>
-                <p style='color: #444; line-height: 1.6;'>2. 按照0-9 A-Z替换，如替换完仍然有重复，请手工手改</p>
-            </div>
-        """, unsafe_allow_html=True)
+        st.markdown(_INSTRUCTION_HTML, unsafe_allow_html=True)
 
         # 文件上传组件
         uploaded_file = st.file_uploader("选择Excel文件上传", type=['xlsx', 'xls'])
@@ -138,7 +191,7 @@ def main():
             try:
                 with st.spinner('正在处理数据...'):
                     # 读取上传的文件
-                    df = pd.read_excel(uploaded_file)
+                    df = load_excel(uploaded_file.getvalue())
                     
                     # 处理数据
                     processed_df, processing_time = process_duplicates(df)
@@ -150,10 +203,15 @@ def main():
                     st.markdown("<h4 style='color: #FF4B4B; margin: 2rem 0 1rem 0;'>🔍 处理结果预览</h4>", unsafe_allow_html=True)
                     st.dataframe(processed_df, use_container_width=True)
                     
-                    # 准备下载处理后的文件
+                    # 准备下载处理后的文件，以只写模式逐行写出，不在内存中构建完整工作簿
                     output = io.BytesIO()
-                    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                        processed_df.to_excel(writer, index=False)
+                    workbook = openpyxl.Workbook(write_only=True)
+                    worksheet = workbook.create_sheet('Sheet1')
+                    worksheet.append(list(processed_df.columns))
+                    export_df = processed_df.astype(object).where(processed_df.notna(), None)
+                    for row in export_df.itertuples(index=False, name=None):
+                        worksheet.append(row)
+                    workbook.save(output)
                     
                     # 下载按钮
                     st.download_button(
@@ -162,6 +220,14 @@ def main():
                         file_name="processed_data.xlsx",
                         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
                     )
+                    
+                    # CSV下载按钮，不经过Excel序列化，适合数据量较大时使用
+                    st.download_button(
+                        label="📥 下载CSV文件",
+                        data=processed_df.to_csv(index=False).encode('utf-8-sig'),
+                        file_name="processed_data.csv",
+                        mime="text/csv"
+                    )
                 
             except Exception as e:
                 st.error(f"❌ 处理文件时出错: {str(e)}")